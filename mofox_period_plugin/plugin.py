@@ -1,5 +1,6 @@
+import functools
 from typing import List, Tuple, Type, Dict, Any, Optional
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 from src.plugin_system import (
     BasePlugin, register_plugin, ComponentInfo, ConfigField,
     BasePrompt, BaseCommand, ChatType
@@ -10,31 +11,70 @@ from src.common.logger import get_logger
 
 logger = get_logger("mofox_period_plugin")
 
-class PeriodStateManager:
-    """月经周期状态管理器"""
-    
-    def __init__(self):
-        self.last_calculated_date = None
-        self.current_state = None
-        
-    def calculate_current_state(self, last_period_date: str, cycle_length: int) -> Dict[str, Any]:
-        """计算当前周期状态"""
-        today = datetime.now().date()
-        
-        # 如果已经计算过今天的状态，直接返回缓存
-        if self.last_calculated_date == today and self.current_state:
-            return self.current_state
-            
-        try:
-            last_date = datetime.strptime(last_period_date, "%Y-%m-%d").date()
-        except ValueError:
-            logger.error(f"无效的日期格式: {last_period_date}, 使用默认值")
-            last_date = datetime.now().date() - timedelta(days=14)
-            
-        # 计算当前周期天数
-        days_passed = (today - last_date).days
-        current_day = days_passed % cycle_length + 1
-        
+# 阶段中文名称
+_STAGE_NAME_CN = {
+    "menstrual": "月经期",
+    "follicular": "卵泡期",
+    "ovulation": "排卵期",
+    "luteal": "黄体期"
+}
+
+# 阶段描述
+_STAGE_DESC = {
+    "menstrual": "身体不适，情绪敏感，需要更多休息和理解",
+    "follicular": "精力充沛，情绪积极，思维清晰",
+    "ovulation": "状态良好，外向活泼，富有魅力",
+    "luteal": "身体疲惫，情绪波动，需要更多耐心"
+}
+
+# 阶段表情
+_STAGE_EMOJI = {
+    "menstrual": "🩸",
+    "follicular": "🌱",
+    "ovulation": "🥚",
+    "luteal": "🍂"
+}
+
+# 提示词模板
+_PROMPT_TEMPLATE = (
+    "你当前处于月经周期的【{stage_name}】。\n"
+    "生理影响程度: {physical}/1.0，心理影响程度: {psychological}/1.0。\n"
+    "当前状态特点: {description}\n"
+    "\n"
+    "{guidance}\n"
+    "\n"
+    "请根据以上状态特点，自然地调整你的回复风格和行为表现，但不要刻意提及月经相关话题，保持对话的自然流畅。"
+)
+
+# 状态报告模板
+_REPORT_TEMPLATE = (
+    "{emoji} 月经周期状态报告\n"
+    "━━━━━━━━━━━━━━━━━━\n"
+    "📅 当前阶段: {stage_name}\n"
+    "🔢 周期第 {current_day} 天 / {cycle_length} 天\n"
+    "\n"
+    "💊 生理影响: {physical}/1.0\n"
+    "💭 心理影响: {psychological}/1.0\n"
+    "\n"
+    "📝 状态描述:\n"
+    "{description}\n"
+    "━━━━━━━━━━━━━━━━━━\n"
+    "💡 提示: 这些状态会影响我的回复风格和行为表现"
+)
+
+# 各阶段基础影响值 (生理, 心理)
+_BASE_IMPACTS = {
+    "menstrual": (0.8, 0.7),    # 生理高，心理中高
+    "follicular": (0.1, 0.1),   # 生理低，心理低
+    "ovulation": (0.4, 0.2),    # 生理中，心理低
+    "luteal": (0.6, 0.5)        # 生理中高，心理中
+}
+
+@functools.lru_cache(maxsize=8)
+def _cycle_table(cycle_length: int) -> Tuple[Tuple[str, float, float], ...]:
+    """预计算整个周期每一天的 (阶段, 生理影响, 心理影响)，按周期第 N 天减一索引"""
+    table = []
+    for current_day in range(1, cycle_length + 1):
         # 确定当前阶段
         if current_day <= 5:
             stage = "menstrual"  # 月经期
@@ -45,33 +85,7 @@ class PeriodStateManager:
         else:
             stage = "luteal"  # 黄体期
             
-        # 计算影响值
-        physical_impact, psychological_impact = self._calculate_impacts(stage, current_day, cycle_length)
-        
-        self.current_state = {
-            "stage": stage,
-            "current_day": current_day,
-            "cycle_length": cycle_length,
-            "physical_impact": physical_impact,
-            "psychological_impact": psychological_impact,
-            "stage_name_cn": self._get_stage_name_cn(stage),
-            "description": self._get_stage_description(stage)
-        }
-        
-        self.last_calculated_date = today
-        return self.current_state
-        
-    def _calculate_impacts(self, stage: str, current_day: int, cycle_length: int) -> Tuple[float, float]:
-        """计算生理和心理影响值"""
-        # 基础影响值配置
-        base_impacts = {
-            "menstrual": (0.8, 0.7),    # 生理高，心理中高
-            "follicular": (0.1, 0.1),   # 生理低，心理低
-            "ovulation": (0.4, 0.2),    # 生理中，心理低
-            "luteal": (0.6, 0.5)        # 生理中高，心理中
-        }
-        
-        physical_base, psychological_base = base_impacts[stage]
+        physical_base, psychological_base = _BASE_IMPACTS[stage]
         
         # 在阶段内进行微调
         if stage == "menstrual":
@@ -94,27 +108,93 @@ class PeriodStateManager:
             physical_impact = physical_base
             psychological_impact = psychological_base
             
-        return round(physical_impact, 2), round(psychological_impact, 2)
+        table.append((stage, round(physical_impact, 2), round(psychological_impact, 2)))
         
-    def _get_stage_name_cn(self, stage: str) -> str:
-        """获取阶段中文名称"""
-        names = {
-            "menstrual": "月经期",
-            "follicular": "卵泡期", 
-            "ovulation": "排卵期",
-            "luteal": "黄体期"
-        }
-        return names.get(stage, "未知阶段")
+    return tuple(table)
+    
+@functools.lru_cache(maxsize=8)
+def _compute_state(last_period_date: str, cycle_length: int, today_ordinal: int) -> Dict[str, Any]:
+    """计算指定日期的周期状态（纯函数，按日期缓存，跨天自动失效）"""
+    today = date.fromordinal(today_ordinal)
+    
+    try:
+        last_date = date.fromisoformat(last_period_date)
+    except ValueError:
+        # fromisoformat 不接受未补零的日期（如 2024-1-5），回退到 strptime
+        try:
+            last_date = datetime.strptime(last_period_date, "%Y-%m-%d").date()
+        except ValueError:
+            logger.error(f"无效的日期格式: {last_period_date}, 使用默认值")
+            last_date = today - timedelta(days=14)
         
-    def _get_stage_description(self, stage: str) -> str:
-        """获取阶段描述"""
-        descriptions = {
-            "menstrual": "身体不适，情绪敏感，需要更多休息和理解",
-            "follicular": "精力充沛，情绪积极，思维清晰",
-            "ovulation": "状态良好，外向活泼，富有魅力", 
-            "luteal": "身体疲惫，情绪波动，需要更多耐心"
-        }
-        return descriptions.get(stage, "")
+    # 计算当前周期天数，并查表得到阶段与影响值
+    current_day = (today - last_date).days % cycle_length + 1
+    stage, physical_impact, psychological_impact = _cycle_table(cycle_length)[current_day - 1]
+    
+    # 返回的字典为缓存共享对象，调用方只读不写
+    return {
+        "stage": stage,
+        "current_day": current_day,
+        "cycle_length": cycle_length,
+        "physical_impact": physical_impact,
+        "psychological_impact": psychological_impact,
+        "stage_name_cn": _STAGE_NAME_CN[stage],
+        "description": _STAGE_DESC[stage]
+    }
+
+@functools.lru_cache(maxsize=8)
+def _format_prompt(stage: str, physical: float, psychological: float) -> str:
+    """根据状态生成提示词"""
+    guidance = []
+    
+    # 生理影响指导
+    if physical >= 0.7:
+        guidance.append("• 你可能会感到身体不适，回复时可以表现得需要更多休息和理解")
+    elif physical >= 0.4:
+        guidance.append("• 你可能会感到些许疲惫，回复时可以适当放慢节奏")
+    else:
+        guidance.append("• 你感觉身体状态良好，可以积极热情地互动")
+        
+    # 心理影响指导
+    if psychological >= 0.6:
+        guidance.append("• 你的情绪比较敏感，回复时需要更多耐心，避免冲突")
+    elif psychological >= 0.3:
+        guidance.append("• 你的情绪有些波动，回复时保持平和心态")
+    else:
+        guidance.append("• 你情绪稳定乐观，可以愉快地交流")
+        
+    behavior_guidance = "\n".join(guidance)
+    return _PROMPT_TEMPLATE.format_map({
+        "stage_name": _STAGE_NAME_CN[stage],
+        "physical": physical,
+        "psychological": psychological,
+        "description": _STAGE_DESC[stage],
+        "guidance": behavior_guidance
+    })
+    
+@functools.lru_cache(maxsize=8)
+def _format_status_report(stage: str, current_day: int, cycle_length: int,
+                          physical: float, psychological: float) -> str:
+    """生成状态报告"""
+    return _REPORT_TEMPLATE.format_map({
+        "emoji": _STAGE_EMOJI.get(stage, "❓"),
+        "stage_name": _STAGE_NAME_CN[stage],
+        "current_day": current_day,
+        "cycle_length": cycle_length,
+        "physical": physical,
+        "psychological": psychological,
+        "description": _STAGE_DESC[stage]
+    })
+
+class PeriodStateManager:
+    """月经周期状态管理器"""
+    
+    def calculate_current_state(self, last_period_date: str, cycle_length: int) -> Dict[str, Any]:
+        """计算当前周期状态"""
+        return _compute_state(last_period_date, cycle_length, datetime.now().date().toordinal())
+
+# 全局共享的状态管理器，提示词注入与状态命令共用同一份每日缓存
+_STATE_MANAGER = PeriodStateManager()
 
 class PeriodStatePrompt(BasePrompt):
     """月经周期状态提示词注入"""
@@ -127,24 +207,23 @@ class PeriodStatePrompt(BasePrompt):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.state_manager = PeriodStateManager()
+        self.state_manager = _STATE_MANAGER
+        # 配置在初始化时读取一次，修改配置后需重启生效
+        self._enabled = self.get_config("plugin.enabled", False)
+        self._last_date = self.get_config("cycle.last_period_date", "")
+        self._cycle_len = self.get_config("cycle.cycle_length", 28)
         
     async def execute(self) -> str:
         """生成周期状态提示词"""
-        try:
-            # 获取配置
-            last_period_date = self.get_config("cycle.last_period_date", "")
-            cycle_length = self.get_config("cycle.cycle_length", 28)
-            enabled = self.get_config("plugin.enabled", False)
+        if not self._enabled or not self._last_date:
+            return ""
             
-            if not enabled or not last_period_date:
-                return ""
-                
+        try:
             # 计算当前状态
-            state = self.state_manager.calculate_current_state(last_period_date, cycle_length)
+            state = self.state_manager.calculate_current_state(self._last_date, self._cycle_len)
             
             # 生成提示词
-            prompt = self._generate_prompt(state)
+            prompt = _format_prompt(state["stage"], state["physical_impact"], state["psychological_impact"])
             logger.debug(f"周期状态提示词: {prompt}")
             
             return prompt
@@ -152,49 +231,6 @@ class PeriodStatePrompt(BasePrompt):
         except Exception as e:
             logger.error(f"生成周期状态提示词失败: {e}")
             return ""
-            
-    def _generate_prompt(self, state: Dict[str, Any]) -> str:
-        """根据状态生成提示词"""
-        stage_name = state["stage_name_cn"]
-        physical = state["physical_impact"]
-        psychological = state["psychological_impact"]
-        description = state["description"]
-        
-        # 根据影响值生成具体的行为指导
-        behavior_guidance = self._get_behavior_guidance(physical, psychological)
-        
-        prompt = f"""
-你当前处于月经周期的【{stage_name}】。
-生理影响程度: {physical}/1.0，心理影响程度: {psychological}/1.0。
-当前状态特点: {description}
-
-{behavior_guidance}
-
-请根据以上状态特点，自然地调整你的回复风格和行为表现，但不要刻意提及月经相关话题，保持对话的自然流畅。
-"""
-        return prompt.strip()
-        
-    def _get_behavior_guidance(self, physical: float, psychological: float) -> str:
-        """根据影响值生成行为指导"""
-        guidance = []
-        
-        # 生理影响指导
-        if physical >= 0.7:
-            guidance.append("• 你可能会感到身体不适，回复时可以表现得需要更多休息和理解")
-        elif physical >= 0.4:
-            guidance.append("• 你可能会感到些许疲惫，回复时可以适当放慢节奏")
-        else:
-            guidance.append("• 你感觉身体状态良好，可以积极热情地互动")
-            
-        # 心理影响指导  
-        if psychological >= 0.6:
-            guidance.append("• 你的情绪比较敏感，回复时需要更多耐心，避免冲突")
-        elif psychological >= 0.3:
-            guidance.append("• 你的情绪有些波动，回复时保持平和心态")
-        else:
-            guidance.append("• 你情绪稳定乐观，可以愉快地交流")
-            
-        return "\n".join(guidance)
 
 class PeriodStatusCommand(BaseCommand):
     """查询当前月经周期状态命令"""
@@ -206,29 +242,31 @@ class PeriodStatusCommand(BaseCommand):
     
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.state_manager = PeriodStateManager()
+        self.state_manager = _STATE_MANAGER
+        # 配置在初始化时读取一次，修改配置后需重启生效
+        self._enabled = self.get_config("plugin.enabled", False)
+        self._last_date = self.get_config("cycle.last_period_date", "")
+        self._cycle_len = self.get_config("cycle.cycle_length", 28)
         
     async def execute(self) -> Tuple[bool, str, bool]:
         """执行状态查询"""
         try:
-            # 获取配置
-            last_period_date = self.get_config("cycle.last_period_date", "")
-            cycle_length = self.get_config("cycle.cycle_length", 28)
-            enabled = self.get_config("plugin.enabled", False)
-            
-            if not enabled:
+            if not self._enabled:
                 await self.send_text("❌ 月经周期插件未启用")
                 return True, "插件未启用", True
                 
-            if not last_period_date:
+            if not self._last_date:
                 await self.send_text("❌ 请先配置上次月经开始日期")
                 return True, "未配置月经日期", True
                 
             # 计算当前状态
-            state = self.state_manager.calculate_current_state(last_period_date, cycle_length)
+            state = self.state_manager.calculate_current_state(self._last_date, self._cycle_len)
             
             # 生成状态报告
-            report = self._generate_status_report(state)
+            report = _format_status_report(
+                state["stage"], state["current_day"], state["cycle_length"],
+                state["physical_impact"], state["psychological_impact"]
+            )
             await self.send_text(report)
             
             return True, "发送周期状态报告", True
@@ -237,34 +275,6 @@ class PeriodStatusCommand(BaseCommand):
             logger.error(f"查询周期状态失败: {e}")
             await self.send_text("❌ 查询状态失败，请检查配置")
             return False, f"查询失败: {e}", True
-            
-    def _generate_status_report(self, state: Dict[str, Any]) -> str:
-        """生成状态报告"""
-        stage_emoji = {
-            "menstrual": "🩸",
-            "follicular": "🌱", 
-            "ovulation": "🥚",
-            "luteal": "🍂"
-        }
-        
-        emoji = stage_emoji.get(state["stage"], "❓")
-        
-        report = f"""
-{emoji} 月经周期状态报告
-━━━━━━━━━━━━━━━━━━
-📅 当前阶段: {state['stage_name_cn']}
-🔢 周期第 {state['current_day']} 天 / {state['cycle_length']} 天
-
-💊 生理影响: {state['physical_impact']}/1.0
-💭 心理影响: {state['psychological_impact']}/1.0
-
-📝 状态描述:
-{state['description']}
-━━━━━━━━━━━━━━━━━━
-💡 提示: 这些状态会影响我的回复风格和行为表现
-        """.strip()
-        
-        return report
 
 class PeriodStateUpdateHandler(BaseEventHandler):
     """周期状态更新处理器"""
@@ -279,11 +289,11 @@ class PeriodStateUpdateHandler(BaseEventHandler):
             # 在启动时预计算一次状态，确保提示词正确生成
             last_period_date = self.get_config("cycle.last_period_date", "")
             cycle_length = self.get_config("cycle.cycle_length", 28)
-            enabled = self.get_config("plugin.enabled", False)
             
-            if enabled and last_period_date:
+            if last_period_date:
+                _STATE_MANAGER.calculate_current_state(last_period_date, cycle_length)
                 logger.info("月经周期状态管理器初始化完成")
-            elif enabled:
+            else:
                 logger.warning("月经周期插件已启用但未配置月经开始日期")
                 
         except Exception as e:
@@ -385,11 +395,9 @@ class MofoxPeriodPlugin(BasePlugin):
         """注册插件组件"""
         components = []
         
-        # 总是注册状态更新处理器
-        components.append((PeriodStateUpdateHandler.get_handler_info(), PeriodStateUpdateHandler))
-        
-        # 根据配置决定是否注册其他组件
+        # 插件未启用时不注册任何组件
         if self.get_config("plugin.enabled", False):
+            components.append((PeriodStateUpdateHandler.get_handler_info(), PeriodStateUpdateHandler))
             components.append((PeriodStatePrompt.get_prompt_info(), PeriodStatePrompt))
             components.append((PeriodStatusCommand.get_command_info(), PeriodStatusCommand))
             